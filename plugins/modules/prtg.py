@@ -40,12 +40,19 @@ options:
     required: true
   device_id:
     description:
-      - ID of PRTG device (one of device_name or device_id required)
+      - ID of PRTG device (one of device_name, device_names or device_id required)
     required: false
   device_name:
     description:
-      - Name/host of device (one of device_name or device_id required)
+      - Name/host of device (one of device_name, device_names or device_id required)
     required: false
+  device_names:
+    description:
+      - List of device names/hosts to manage in one task (used instead of device_name or device_id)
+      - All devices are looked up first, then the same state and enabled settings apply to each
+    required: false
+    type: list
+    elements: str
   clone_from:
     description:
       - ID of PRTG device to "clone" new device from
@@ -66,9 +73,16 @@ options:
       - Disabling a device pauses it
     required: false
     default: true
+  cache_dir:
+    description:
+      - Directory for caching the parent group lookup of clone_from between runs (e.g. ~/.ansible_prtg_cache)
+      - Cached entries expire after 60 seconds and are kept per PRTG URL and API user
+      - Caching is disabled unless this is set
+    required: false
+    type: path
 
 
-requirements: ["PRTG installation must be accessible from ansible client"]
+requirements: ["PRTG installation must be accessible from ansible client", "diskcache (only when cache_dir is set)"]
 '''
 
 EXAMPLES = '''
@@ -80,6 +94,15 @@ EXAMPLES = '''
          dest_group=5678
          state=present
          enabled=yes
+
+- prtg:
+    prtg_url: "https://prtg.example.com/"
+    api_user: ansible_api
+    api_passhash: 1234567890
+    device_names:
+      - web01.example.com
+      - web02.example.com
+    enabled: no
 '''
 
 from ansible.module_utils.six.moves.urllib.parse import urlencode
@@ -87,14 +110,40 @@ try:
     import json
 except ImportError:
     import simplejson as json
-import xml.etree.ElementTree as ET
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 import re
+import gzip
+from io import BytesIO
+import hashlib
+try:
+    import diskcache
+    HAS_DISKCACHE = True
+except ImportError:
+    HAS_DISKCACHE = False
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# API response statuses we accept, and the ones we know how to explain
+OK_STATUSES = frozenset([200, 302])
+ERROR_MESSAGES = {
+    401: 'Invalid API credentials',
+    404: 'Invalid API URL',
+    400: 'The API call could not be completed successfully',
+}
+
+# parent group ID in the getobjectstatus.htm response
+THISID_RE = re.compile(br'thisid="([0-9]+)"')
+# new device ID in the URL PRTG redirects to after duplicating a device
+NEW_DEV_RE = re.compile(r'id%3D([0-9]+)')
 
 # ===========================================
 # PRTG helper methods
 #
 
-def api_call(module, path, params):
+def api_call(module, path, params, headers=None):
     
     # determine URL for PRTG API
     if (module.params['prtg_url']).endswith('/'):
@@ -106,30 +155,116 @@ def api_call(module, path, params):
     params['username'] = module.params['api_user']
     params['passhash'] = module.params['api_passhash']
 
-    data = urlencode(params)
-
-    url = url + '?' + data
-
-    return fetch_url(module, url, method='GET')
+    # send them as a form body rather than a query string so long filters
+    # don't hit URL length limits and the passhash stays out of access logs
+    data = urlencode(params).encode()
+    headers = dict(headers or {})
+    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+    return fetch_url(module, url, data=data, headers=headers, method='POST')
+
+
+def cached_get(module, path, params, ttl=60):
+    # only used for lookups that don't change between runs; anything that
+    # reflects device state or mutates it must go through api_call directly
+    if not module.params['cache_dir']:
+        resp, info = api_call(module, path, dict(params))
+        body = resp.read() if resp else None
+        if resp:
+            resp.close()
+        return body, info
+
+    # key on the install, user and query, leaving the passhash out
+    key = hashlib.sha1(repr((module.params['prtg_url'], module.params['api_user'], path, sorted(params.items()))).encode()).hexdigest()
+    cache = diskcache.Cache(module.params['cache_dir'])
+    try:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit[1], {'status': hit[0]}
+
+        resp, info = api_call(module, path, dict(params))
+        body = resp.read() if resp else None
+        if resp:
+            resp.close()
+        if info['status'] == 200:
+            cache.set(key, (info['status'], body), expire=ttl)
+    finally:
+        cache.close()
+
+    return body, info
 
 
 def validate_response(module, resp_info):
-    
-    if resp_info['status']:
-        if resp_info['status'] == 401:
-            module.fail_json(msg='Invalid API credentials')
-        elif resp_info['status'] == 404:
-            module.fail_json(msg='Invalid API URL')
-        elif resp_info['status'] == 400:
-            module.fail_json(msg='The API call could not be completed successfully')
-        elif resp_info['status'] == 200:
-            return 200
-        elif resp_info['status'] == 302:
-            return 302
-    else:
-        module.fail_json(msg='Unable to reach API server')
 
-    return 0
+    status = resp_info.get('status')
+    if not status:
+        module.fail_json(msg='Unable to reach API server')
+    if status in ERROR_MESSAGES:
+        module.fail_json(msg=ERROR_MESSAGES[status])
+
+    return status if status in OK_STATUSES else 0
+
+def fetch_devices(module, filters, columns='objid,host,active'):
+    # request only the matching rows and columns from the device table
+    params = {'content':'devices', 'output':'json', 'columns':columns}
+    params.update(filters)
+
+    # failures are handed back rather than reported; the caller decides
+    # whether to fail the module
+    check_resp, check_info = api_call(module, '/api/table.json', params, headers={'Accept-Encoding':'gzip'})
+    if check_info['status'] != 200:
+        if check_resp:
+            check_resp.close()
+        return None, check_info
+    check_body = check_resp.read()
+    check_resp.close()
+
+    # newer fetch_url versions decompress on their own but still report the
+    # header, so check the body itself before unpacking it
+    if check_info.get('content-encoding') == 'gzip' and check_body[:2] == GZIP_MAGIC:
+        check_body = gzip.GzipFile(fileobj=BytesIO(check_body)).read()
+    check_result = json_loads( check_body )
+
+    return check_result['devices'], None
+
+def check_lookup(module, error_info):
+    if error_info:
+        validate_response(module, error_info)
+        module.fail_json(msg='API request failed')
+
+def find_device(module, device_name):
+    # let PRTG filter by name first
+    devices, error_info = fetch_devices(module, {'filter_name':'@sub(' + device_name + ')'})
+    if error_info:
+        return None, error_info
+
+    # a substring match on the name can return several devices (web1 also
+    # matches web10), so a device whose host is exactly the requested name
+    # wins, whether or not the name filter returned it
+    needle = device_name.lower()
+    by_host = dict((dev['host'].lower(), dev) for dev in reversed(devices))
+    if needle in by_host:
+        return by_host[needle], None
+
+    host_devices, error_info = fetch_devices(module, {'filter_host':device_name})
+    if error_info:
+        return None, error_info
+    if host_devices:
+        return host_devices[0], None
+
+    if devices:
+        return devices[0], None
+    return None, None
+
+def find_devices(module, device_names):
+    # look every device up before changing any of them
+    devices = []
+    for device_name in device_names:
+        dev, error_info = find_device(module, device_name)
+        check_lookup(module, error_info)
+        devices.append(dev)
+
+    return devices
 
 def pause_device(module, device_id, paused):
     # set paused var for api_call
@@ -147,67 +282,7 @@ def pause_device(module, device_id, paused):
     return True
 
 
-# ===========================================
-# Module execution
-#
-
-def main():
-
-    module = AnsibleModule(
-        argument_spec=dict(
-            api_user=dict(required=True),
-            api_passhash=dict(required=True),
-            prtg_url=dict(required=True),
-            device_id=dict(required=False),
-            device_name=dict(required=False),
-            state=dict(default='present', choices=['present', 'absent']),
-            enabled=dict(required=False, default=True, type='bool'),
-            clone_from=dict(required=False),
-            dest_group=dict(required=False),
-            validate_certs = dict(default='yes', type='bool'),
-        ),
-        required_one_of=[['device_id', 'device_name']],
-        supports_check_mode=True
-    )
-
-    device_id = module.params['device_id']
-    device_name = module.params['device_name']
-
-    # check if device exists
-    if not device_id:
-
-        # do an API call and get results
-        check_resp, check_info = api_call(module, '/api/table.json', {'content':'devices', 'output':'json', 'columns':'objid,device,host,group,active', 'count':10000})
-        
-        if(validate_response(module, check_info) != 200):
-            module.fail_json(msg='API request failed')
-        check_result = json.loads( check_resp.read() )
-        check_resp.close()
-
-        # iterate through list of devices and see if we can find a match by device name or host
-        for dev in check_result['devices']:
-            # check by name
-            if device_name.lower() in dev['device'].lower():
-                device_id = dev['objid']
-                break
-
-            # check by host
-            if device_name.lower() == dev['host'].lower():
-                device_id = dev['objid']
-                break
-    # device_id is specified, so grab device info
-    else:
-        check_resp, check_info = api_call(module, '/api/table.json', {'content':'devices', 'output':'json', 'columns':'objid,device,host,group,active', 'filter_objid':device_id})
-        if(validate_response(module, check_info) != 200):
-            module.fail_json(msg='API request failed')
-        check_result = json.loads( check_resp.read() )
-        check_resp.close()
-
-        # check to see if device exists
-        if check_result['devices']:
-            device_id = dev['objid']
-
-    
+def ensure_device(module, device_id, device_name, dev, enabled):
     # setup changed variable
     dev_changed = False
 
@@ -216,6 +291,8 @@ def main():
     #
 
     # device should be present and needs to be created
+    # (PRTG happily duplicates into an existing name, so the lookup that
+    # got us here is what keeps this idempotent)
     if module.params['state'] == 'present' and not device_id:
         # do some error checking
         if not module.params['clone_from']:
@@ -227,33 +304,30 @@ def main():
             if module.params['dest_group']:
                 dest_group = module.params['dest_group']
             else:
-                group_resp, group_info = api_call(module, '/api/getobjectstatus.htm', {'id':module.params['clone_from'], 'name':'group', 'show':'text'})
+                group_body, group_info = cached_get(module, '/api/getobjectstatus.htm', {'id':module.params['clone_from'], 'name':'group', 'show':'text'})
                 if(validate_response(module, group_info) != 200):
                     module.fail_json(msg='API request failed')
-                group_result = ET.fromstring( group_resp.read() )
-                group_resp.close()
-
-                if group_result[1] is not None and group_result[1].tag == 'result':
-                    dest_group = group_result[1][0].attrib['thisid']
+                group_match = THISID_RE.search(group_body)
+                if group_match:
+                    dest_group = group_match.group(1).decode()
                 else:
                     module.fail_json(msg='Unable to find parent group of clone_from')
             
             # create the new device
-            create_resp, create_info = api_call(module, '/api/duplicateobject.htm', {'id':module.params['clone_from'], 'name':module.params['device_name'], 'host':module.params['device_name'], 'targetid':dest_group})            
+            create_resp, create_info = api_call(module, '/api/duplicateobject.htm', {'id':module.params['clone_from'], 'name':device_name, 'host':device_name, 'targetid':dest_group})            
             if(validate_response(module, create_info) != 200):
                 module.fail_json(msg='API request failed')
             create_resp.close()
 
             # extract the new device ID from the URL returned by PRTG
-            new_dev_re = re.compile('id%3D([0-9]+)')
-            new_dev_match = new_dev_re.search(create_info['url'])
+            new_dev_match = NEW_DEV_RE.search(create_info['url'])
             if new_dev_match:
                 new_dev_id = new_dev_match.group(1)
             else:
                 module.fail_json(msg='Unable to parse new device ID from return request')
 
             # unpause device if desired
-            if module.boolean(module.params['enabled']):
+            if enabled:
                 pause_device(module, new_dev_id, paused=False)
 
         # set the changed flag
@@ -263,11 +337,11 @@ def main():
     elif module.params['state'] == 'present' and device_id:
         
         # change paused state if necessary
-        if module.boolean(module.params['enabled']) == True and dev['active_raw'] == 0:
+        if enabled and dev['active_raw'] == 0:
             if not module.check_mode:
                 pause_device(module, device_id, paused=False)
             dev_changed = True
-        elif module.boolean(module.params['enabled']) == False and dev['active_raw'] == -1:
+        elif not enabled and dev['active_raw'] == -1:
             if not module.check_mode:
                 pause_device(module, device_id, paused=True)
             dev_changed = True
@@ -291,7 +365,92 @@ def main():
         # no need to do anything
         pass
 
+    return dev_changed
+
+
+# ===========================================
+# Module execution
+#
+
+def main():
+
+    module = AnsibleModule(
+        argument_spec=dict(
+            api_user=dict(required=True),
+            api_passhash=dict(required=True),
+            prtg_url=dict(required=True),
+            device_id=dict(required=False),
+            device_name=dict(required=False),
+            device_names=dict(required=False, type='list', elements='str'),
+            state=dict(default='present', choices=['present', 'absent']),
+            enabled=dict(required=False, default=True, type='bool'),
+            clone_from=dict(required=False),
+            dest_group=dict(required=False),
+            validate_certs = dict(default='yes', type='bool'),
+            cache_dir=dict(required=False, type='path'),
+        ),
+        required_one_of=[['device_id', 'device_name', 'device_names']],
+        mutually_exclusive=[['device_names', 'device_id'], ['device_names', 'device_name']],
+        supports_check_mode=True
+    )
+
+    if module.params['cache_dir'] and not HAS_DISKCACHE:
+        module.fail_json(msg=missing_required_lib('diskcache'))
+
+    device_id = module.params['device_id']
+    device_name = module.params['device_name']
+    enabled = module.boolean(module.params['enabled'])
+    dev = None
+
+    # several devices given, so look them all up and then handle each
+    if module.params['device_names'] is not None:
+        # drop repeated names so a device isn't created twice
+        device_names = []
+        seen = set()
+        for name in module.params['device_names']:
+            if name.lower() not in seen:
+                seen.add(name.lower())
+                device_names.append(name)
+
+        dev_changed = False
+
+        # a failure part way through still has to report the devices
+        # that were already changed
+        fail_json = module.fail_json
+        module.fail_json = lambda **kwargs: fail_json(changed=dev_changed, **kwargs)
+
+        for device_name, dev in zip(device_names, find_devices(module, device_names)):
+            device_id = dev['objid'] if dev else None
+            if ensure_device(module, device_id, device_name, dev, enabled):
+                dev_changed = True
+
+        module.exit_json(changed=dev_changed, )
+
+    # check if device exists
+    if not device_id:
+
+        dev, error_info = find_device(module, device_name)
+        check_lookup(module, error_info)
+        if dev:
+            device_id = dev['objid']
+    # device_id is specified, so grab device info
+    else:
+        devices, error_info = fetch_devices(module, {'filter_objid':device_id}, columns='objid,active')
+        check_lookup(module, error_info)
+
+        # check to see if device exists; without a device_name there is
+        # nothing to create it under
+        if devices:
+            dev = devices[0]
+            device_id = dev['objid']
+        elif module.params['state'] == 'present' and not device_name:
+            module.fail_json(msg='device_id %s not found' % device_id)
+        else:
+            device_id = None
+
     
+    dev_changed = ensure_device(module, device_id, device_name, dev, enabled)
+
     # nothing else to see here
     module.exit_json(changed=dev_changed, )
 